@@ -9,18 +9,42 @@
     NOTE: This code requires that the original nodes be numbered starting from 1.
     If this is not the case, then the code 'renumberNodesAndConnectivity' must 
     be executed prior to using this code
+    
+    Setting the environment variable ABQ_SCALER_BINARY=1 writes the scaled nodal coordinates to a binary
+    'nodalCoordsScaled.npy' file (columns: node ID, X, Y, Z) instead of the formatted text file, which is
+    much faster to write and to reload with numpy.load for large meshes.
+    
+    Setting the environment variable ABQ_SCALER_NUMBA=1 scales the coordinates with a numba compiled kernel
+    (numba must be installed). It only pays off for meshes of tens of millions of nodes: importing numba
+    and compiling the kernel cost about a second, and the compiled kernel is cached in __pycache__.
 '''
 import sys
 import os
-import statistics as stats
-import random as rand
-import time
 import numpy as np
-import math
-import inspect
 from parseAbqInpFileForNodalCoords import parseAbqInpFileForNodalCoords
 from parseAbqInpFileForNodeSets import parseAbqInpFileForNodeSets
 
+# Node sets controlling each direction, ordered left to right (length, width) and bottom to top (depth).
+# Names are compared case-insensitively, so they are stored uppercased once here
+NODE_SETS_ALONG_LENGTH = tuple(nameNodeSet.upper() for nameNodeSet in ['setControllingBasePlateLengthLeftMost',
+                                                                        'setControllingBasePlateLengthLeft',
+                                                                        'setControllingDepositLength',
+                                                                        'setControllingBasePlateLengthRight',
+                                                                        'setControllingBasePlateLengthRightMost'])
+NODE_SETS_ALONG_WIDTH = tuple(nameNodeSet.upper() for nameNodeSet in ['setControllingBasePlateWidthLeftMost',
+                                                                       'setControllingBasePlateWidthLeft',
+                                                                       'setControllingDepositWidth',
+                                                                       'setControllingBasePlateWidthRight',
+                                                                       'setControllingBasePlateWidthRightMost'])
+NODE_SETS_ALONG_DEPTH = tuple(nameNodeSet.upper() for nameNodeSet in ['setControllingBasePlateDepthBottom',
+                                                                       'setControllingBasePlateDepthTop',
+                                                                       'setControllingDepositDepth'])
+
+# Dimensions of the reference mesh in the order of command line arguments (2) to (14)
+REFERENCE_DIMENSIONS = np.array([3, 2, 10, 2, 3,            # base plate / deposit lengths
+                                 1, 1, 1, 1, 1,             # base plate / deposit widths
+                                 0.995, 0.755, 0.5])        # base plate / deposit depths
+
 
 def main():
     
@@ -49,19 +73,10 @@ def main():
         raise RuntimeError(text)
 
     nameFileInpAbaqus = sys.argv[1]
-    scalingFactorBasePlateLengthLeftCoarseRegion = float(sys.argv[2])/3 # Divide target dimensions with reference dimensions to obtain scaling factors
-    scalingFactorBasePlateLengthLeftFineRegion = float(sys.argv[3])/2
-    scalingFactorDepositLength = float(sys.argv[4])/10
-    scalingFactorBasePlateLengthRightFineRegion = float(sys.argv[5])/2
-    scalingFactorBasePlateLengthRightCoarseRegion = float(sys.argv[6])/3
-    scalingFactorBasePlateWidthLeftCoarseRegion = float(sys.argv[7])/1
-    scalingFactorBasePlateWidthLeftFineRegion = float(sys.argv[8])/1
-    scalingFactorDepositWidth = float(sys.argv[9])/1
-    scalingFactorBasePlateWidthRightFineRegion = float(sys.argv[10])/1
-    scalingFactorBasePlateWidthRightCoarseRegion = float(sys.argv[11])/1
-    scalingFactorBasePlateDepthBottomCoarseRegion = float(sys.argv[12])/0.995
-    scalingFactorBasePlateDepthTopFineRegion = float(sys.argv[13])/0.755
-    scalingFactorDepositDepth = float(sys.argv[14])/0.5
+    useNumba = os.environ.get('ABQ_SCALER_NUMBA', '0') == '1'
+    # Divide target dimensions with reference dimensions to obtain scaling factors. Entries follow the command
+    # line order, i.e. [0:5] along length, [5:10] along width and [10:13] along depth, matching NODE_SETS_ALONG_*
+    arrayScalingFactors = np.array(sys.argv[2:15], dtype=np.float64)/REFERENCE_DIMENSIONS
     outputPath = sys.argv[15]
         
     pathDir = outputPath + "/"    
@@ -70,202 +85,145 @@ def main():
     # -------------------------------------------------------------------------------------------------------------------------------
     listNodes, listCoordinatesX, listCoordinatesY, listCoordinatesZ = parseAbqInpFileForNodalCoords(nameFileInpAbaqus)    
     listNodeSetsNames, listNodesInNodeSets = parseAbqInpFileForNodeSets(nameFileInpAbaqus)
+    # The parsers may hand back lists or ndarrays; np.asarray converts once and is a no-op for matching ndarrays
+    arrayNodes = np.asarray(listNodes, dtype=np.int64)
+    # Node IDs start from 1, so shift them once to obtain row indices into arrayCoordinates
+    nodeSetIdx = [np.asarray(listNodesInNodeSet, dtype=np.int64) - 1 for listNodesInNodeSet in listNodesInNodeSets]
     
-    coordXmin = min(listCoordinatesX)
-    coordYmin = min(listCoordinatesY)
-    coordZmin = min(listCoordinatesZ)
+    # Nodal coordinates are kept in a single contiguous (nNodes,3) array (columns: X, Y, Z)
+    arrayCoordinates = np.empty((len(arrayNodes),3), dtype=np.float64)
+    arrayCoordinates[:,0] = listCoordinatesX
+    arrayCoordinates[:,1] = listCoordinatesY
+    arrayCoordinates[:,2] = listCoordinatesZ
+    del listNodes, listCoordinatesX, listCoordinatesY, listCoordinatesZ, listNodesInNodeSets     # free the parsed lists
     # Translate the nodal coordinates so that all the coordinates are +ve
-    listCoordinatesX = [listCoordinatesX[ii] - coordXmin for ii in range(0,len(listCoordinatesX))]
-    listCoordinatesY = [listCoordinatesY[ii] - coordYmin for ii in range(0,len(listCoordinatesY))]
-    listCoordinatesZ = [listCoordinatesZ[ii] - coordZmin for ii in range(0,len(listCoordinatesZ))]
+    arrayCoordinates -= arrayCoordinates.min(axis=0, keepdims=True)
     
-    #
-    listMinCoordinatesForUnorderedSetsAlongLength, listMaxCoordinatesForUnorderedSetsAlongLength = [[] for ii in range(0,2)]
-    listMinCoordinatesForUnorderedSetsAlongWidth, listMaxCoordinatesForUnorderedSetsAlongWidth = [[] for ii in range(0,2)]
-    listMinCoordinatesForUnorderedSetsAlongDepth, listMaxCoordinatesForUnorderedSetsAlongDepth = [[] for ii in range(0,2)]
-    for iNodeSet in range(0,len(listNodeSetsNames)):
-        listCoordinatesX_ = [listCoordinatesX[idNode-1] for idNode in listNodesInNodeSets[iNodeSet]]
-        listCoordinatesY_ = [listCoordinatesY[idNode-1] for idNode in listNodesInNodeSets[iNodeSet]]
-        listCoordinatesZ_ = [listCoordinatesZ[idNode-1] for idNode in listNodesInNodeSets[iNodeSet]]
-        
-        listMinCoordinatesForUnorderedSetsAlongLength.append(min(listCoordinatesY_))
-        listMaxCoordinatesForUnorderedSetsAlongLength.append(max(listCoordinatesY_))
-
-        listMinCoordinatesForUnorderedSetsAlongWidth.append(min(listCoordinatesX_))
-        listMaxCoordinatesForUnorderedSetsAlongWidth.append(max(listCoordinatesX_))
-       
-        listMinCoordinatesForUnorderedSetsAlongDepth.append(min(listCoordinatesZ_))
-        listMaxCoordinatesForUnorderedSetsAlongDepth.append(max(listCoordinatesZ_))
+    # Extents of each node set (columns: 0 = X/width, 1 = Y/length, 2 = Z/depth)
+    # computed for all sets at once as segmented reductions over the concatenated set members
+    nNodesInNodeSets = np.array([len(idx) for idx in nodeSetIdx], dtype=np.int64)
+    if np.any(nNodesInNodeSets == 0):
+        raise RuntimeError("Node set '" + listNodeSetsNames[int(np.argmin(nNodesInNodeSets))] + "' does not contain any nodes")
+    # set iNodeSet owns idxNodeSets[idxStartsOfNodeSets[iNodeSet]:idxStartsOfNodeSets[iNodeSet+1]]
+    idxNodeSets = np.concatenate(nodeSetIdx)
+    idxStartsOfNodeSets = np.zeros(len(nodeSetIdx)+1, dtype=np.int64)
+    idxStartsOfNodeSets[1:] = np.cumsum(nNodesInNodeSets)
+    arrayCoordinatesInNodeSets = arrayCoordinates[idxNodeSets]
+    arrayMinCoordinatesForUnorderedSets = np.minimum.reduceat(arrayCoordinatesInNodeSets, idxStartsOfNodeSets[:-1], axis=0)
+    arrayMaxCoordinatesForUnorderedSets = np.maximum.reduceat(arrayCoordinatesInNodeSets, idxStartsOfNodeSets[:-1], axis=0)
+    del arrayCoordinatesInNodeSets
+    
+    # Map the (case-insensitive) node set names to their position in listNodeSetsNames
+    upperSetNames = [nameNodeSet.upper() for nameNodeSet in listNodeSetsNames]
+    nameToIdx = {nameNodeSet:iNodeSet for iNodeSet, nameNodeSet in enumerate(upperSetNames)}
     
     # Determine the ordering of node sets in all directions based on increasing coordinate directions
-    # Find the ordering of node sets in each direction for applying scaling
-    for iNodeSet in range(0,len(listNodeSetsNames)):
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingBasePlateLengthLeftMost".upper():
-           minYalongLength_left = listMinCoordinatesForUnorderedSetsAlongLength[iNodeSet]
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingBasePlateLengthRightMost".upper():
-           minYalongLength_right = listMinCoordinatesForUnorderedSetsAlongLength[iNodeSet]
-
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingBasePlateWidthLeftMost".upper():
-           minXalongWidth_left = listMinCoordinatesForUnorderedSetsAlongWidth[iNodeSet]
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingBasePlateWidthRightMost".upper():
-           minXalongWidth_right = listMinCoordinatesForUnorderedSetsAlongWidth[iNodeSet]
+    # Find the ordering of node sets in each direction for applying scaling (the first and last names
+    # of the NODE_SETS_ALONG_* tuples are the outermost sets, already uppercased)
+    minYalongLength_left = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_LENGTH[0]],1]
+    minYalongLength_right = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_LENGTH[-1]],1]
     
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingBasePlateDepthBottom".upper():
-           minZalongDepth_bottom = listMinCoordinatesForUnorderedSetsAlongDepth[iNodeSet]
-        if listNodeSetsNames[iNodeSet].upper() == "setControllingDepositDepth".upper():
-           listCoordinatesZ_ = [listCoordinatesZ[idNode-1] for idNode in listNodesInNodeSets[iNodeSet]]
-           minZalongDepth_top = listMinCoordinatesForUnorderedSetsAlongDepth[iNodeSet]
+    minXalongWidth_left = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_WIDTH[0]],0]
+    minXalongWidth_right = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_WIDTH[-1]],0]
     
-    if minYalongLength_left < minYalongLength_right:
-        listNodeSetsForOrderingAlongLength = ['setControllingBasePlateLengthLeftMost',
-                                              'setControllingBasePlateLengthLeft',
-                                              'setControllingDepositLength',
-                                              'setControllingBasePlateLengthRight',
-                                              'setControllingBasePlateLengthRightMost']
-                                              
-        listScalingFactorsAlongLength = [scalingFactorBasePlateLengthLeftCoarseRegion,
-                                         scalingFactorBasePlateLengthLeftFineRegion,
-                                         scalingFactorDepositLength,
-                                         scalingFactorBasePlateLengthRightFineRegion,
-                                         scalingFactorBasePlateLengthRightCoarseRegion]
-        
-    else:
-        listNodeSetsForOrderingAlongLength = ['setControllingBasePlateLengthRightMost',
-                                              'setControllingBasePlateLengthRight',
-                                              'setControllingDepositLength',
-                                              'setControllingBasePlateLengthLeft',
-                                              'setControllingBasePlateLengthLeftMost']
-                                              
-        listScalingFactorsAlongLength = [scalingFactorBasePlateLengthRightCoarseRegion,
-                                         scalingFactorBasePlateLengthRightFineRegion,
-                                         scalingFactorDepositLength,
-                                         scalingFactorBasePlateLengthLeftFineRegion,
-                                         scalingFactorBasePlateLengthLeftCoarseRegion]
-                                         
-    listMinCoordinatesForSetOrderingAlongLength = []
-    listMaxCoordinatesForSetOrderingAlongLength = []
-    for iNodeSetOrdered in range(0,len(listNodeSetsForOrderingAlongLength)):
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == listNodeSetsForOrderingAlongLength[iNodeSetOrdered].upper():
-                listMinCoordinatesForSetOrderingAlongLength.append(listMinCoordinatesForUnorderedSetsAlongLength[iNodeSet])
-                listMaxCoordinatesForSetOrderingAlongLength.append(listMaxCoordinatesForUnorderedSetsAlongLength[iNodeSet])
-                                         
-    if minXalongWidth_left < minXalongWidth_right:
-        listNodeSetsForOrderingAlongWidth = ['setControllingBasePlateWidthLeftMost',
-                                             'setControllingBasePlateWidthLeft',
-                                             'setControllingDepositWidth',
-                                             'setControllingBasePlateWidthRight',
-                                             'setControllingBasePlateWidthRightMost']
-                                             
-        listScalingFactorsAlongWidth = [scalingFactorBasePlateWidthLeftCoarseRegion,
-                                        scalingFactorBasePlateWidthLeftFineRegion,
-                                        scalingFactorDepositWidth,
-                                        scalingFactorBasePlateWidthRightFineRegion,
-                                        scalingFactorBasePlateWidthRightCoarseRegion]
-                                        
-    else:
-        listNodeSetsForOrderingAlongWidth = ['setControllingBasePlateWidthRightMost',
-                                             'setControllingBasePlateWidthRight',
-                                             'setControllingDepositWidth',
-                                             'setControllingBasePlateWidthLeft',
-                                             'setControllingBasePlateWidthLeftMost']
-                                             
-        listScalingFactorsAlongWidth = [scalingFactorBasePlateWidthRightCoarseRegion,
-                                        scalingFactorBasePlateWidthRightFineRegion,
-                                        scalingFactorDepositWidth,
-                                        scalingFactorBasePlateWidthLeftFineRegion,
-                                        scalingFactorBasePlateWidthLeftCoarseRegion]
-
-    listMinCoordinatesForSetOrderingAlongWidth = []
-    listMaxCoordinatesForSetOrderingAlongWidth = []
-    for iNodeSetOrdered in range(0,len(listNodeSetsForOrderingAlongWidth)):
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == listNodeSetsForOrderingAlongWidth[iNodeSetOrdered].upper():
-                listMinCoordinatesForSetOrderingAlongWidth.append(listMinCoordinatesForUnorderedSetsAlongWidth[iNodeSet])
-                listMaxCoordinatesForSetOrderingAlongWidth.append(listMaxCoordinatesForUnorderedSetsAlongWidth[iNodeSet])
-                
-    if minZalongDepth_bottom < minZalongDepth_top:
-        listNodeSetsForOrderingAlongDepth = ['setControllingBasePlateDepthBottom',
-                                             'setControllingBasePlateDepthTop',
-                                             'setControllingDepositDepth']
-                                             
-        listScalingFactorsAlongDepth = [scalingFactorBasePlateDepthBottomCoarseRegion,
-                                        scalingFactorBasePlateDepthTopFineRegion,
-                                        scalingFactorDepositDepth]
-                                        
-    else:
-        listNodeSetsForOrderingAlongDepth = ['setControllingDepositDepth',
-                                             'setControllingBasePlateDepthTop',
-                                             'setControllingBasePlateDepthBottom']
-                                             
-        listScalingFactorsAlongDepth = [scalingFactorDepositDepth,
-                                        scalingFactorBasePlateDepthTopFineRegion,
-                                        scalingFactorBasePlateDepthBottomCoarseRegion]
-                                        
-    listMinCoordinatesForSetOrderingAlongDepth = []
-    listMaxCoordinatesForSetOrderingAlongDepth = []
-    for iNodeSetOrdered in range(0,len(listNodeSetsForOrderingAlongDepth)):
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == listNodeSetsForOrderingAlongDepth[iNodeSetOrdered].upper():
-                listMinCoordinatesForSetOrderingAlongDepth.append(listMinCoordinatesForUnorderedSetsAlongDepth[iNodeSet])
-                listMaxCoordinatesForSetOrderingAlongDepth.append(listMaxCoordinatesForUnorderedSetsAlongDepth[iNodeSet])                                        
+    minZalongDepth_bottom = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_DEPTH[0]],2]
+    minZalongDepth_top = arrayMinCoordinatesForUnorderedSets[nameToIdx[NODE_SETS_ALONG_DEPTH[-1]],2]
     
-    # Scale length dimensions
-    translationTotal = 0
-    listCoordinatesYscaled = [1E20]*len(listCoordinatesY)
-    for iNodeSetOrdering in range(0,len(listNodeSetsForOrderingAlongLength)):
-        nameNodeSetOrdering = listNodeSetsForOrderingAlongLength[iNodeSetOrdering]
-        minForThisRegion = listMinCoordinatesForSetOrderingAlongLength[iNodeSetOrdering]
-        maxForThisRegion = listMaxCoordinatesForSetOrderingAlongLength[iNodeSetOrdering]
-        dLength = maxForThisRegion - minForThisRegion     
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == nameNodeSetOrdering.upper():
-                for jNodeID in listNodesInNodeSets[iNodeSet]:
-                    listCoordinatesYscaled[jNodeID-1] = translationTotal +  minForThisRegion + \
-                                    (listCoordinatesY[jNodeID-1] - minForThisRegion)*listScalingFactorsAlongLength[iNodeSetOrdering]
-        translationTotal = translationTotal + dLength*(listScalingFactorsAlongLength[iNodeSetOrdering] - 1)
-        
-    # Scale width dimensions
-    translationTotal = 0
-    listCoordinatesXscaled = [1E20]*len(listCoordinatesX)
-    for iNodeSetOrdering in range(0,len(listNodeSetsForOrderingAlongWidth)):
-        nameNodeSetOrdering = listNodeSetsForOrderingAlongWidth[iNodeSetOrdering]
-        minForThisRegion = listMinCoordinatesForSetOrderingAlongWidth[iNodeSetOrdering]
-        maxForThisRegion = listMaxCoordinatesForSetOrderingAlongWidth[iNodeSetOrdering]
-        dLength = maxForThisRegion - minForThisRegion     
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == nameNodeSetOrdering.upper():
-                for jNodeID in listNodesInNodeSets[iNodeSet]:
-                    listCoordinatesXscaled[jNodeID-1] = translationTotal +  minForThisRegion + \
-                                    (listCoordinatesX[jNodeID-1] - minForThisRegion)*listScalingFactorsAlongWidth[iNodeSetOrdering]
-        translationTotal = translationTotal + dLength*(listScalingFactorsAlongWidth[iNodeSetOrdering] - 1)
+    listNodeSetsForOrderingAlongLength, listScalingFactorsAlongLength = pickOrdering(minYalongLength_left, minYalongLength_right,
+                                                                                     NODE_SETS_ALONG_LENGTH, arrayScalingFactors[0:5])
+    listNodeSetsForOrderingAlongWidth, listScalingFactorsAlongWidth = pickOrdering(minXalongWidth_left, minXalongWidth_right,
+                                                                                   NODE_SETS_ALONG_WIDTH, arrayScalingFactors[5:10])
+    listNodeSetsForOrderingAlongDepth, listScalingFactorsAlongDepth = pickOrdering(minZalongDepth_bottom, minZalongDepth_top,
+                                                                                   NODE_SETS_ALONG_DEPTH, arrayScalingFactors[10:13])
     
-    # Scale depth dimensions
-    translationTotal = 0
-    listCoordinatesZscaled = [1E20]*len(listCoordinatesZ)
-    for iNodeSetOrdering in range(0,len(listNodeSetsForOrderingAlongDepth)):
-        nameNodeSetOrdering = listNodeSetsForOrderingAlongDepth[iNodeSetOrdering]
-        minForThisRegion = listMinCoordinatesForSetOrderingAlongDepth[iNodeSetOrdering]
-        maxForThisRegion = listMaxCoordinatesForSetOrderingAlongDepth[iNodeSetOrdering]
-        dLength = maxForThisRegion - minForThisRegion     
-        for iNodeSet in range(0,len(listNodeSetsNames)):
-            if listNodeSetsNames[iNodeSet].upper() == nameNodeSetOrdering.upper():
-                for jNodeID in listNodesInNodeSets[iNodeSet]:
-                    listCoordinatesZscaled[jNodeID-1] = translationTotal +  minForThisRegion + \
-                                    (listCoordinatesZ[jNodeID-1] - minForThisRegion)*listScalingFactorsAlongDepth[iNodeSetOrdering]
-        translationTotal = translationTotal + dLength*(listScalingFactorsAlongDepth[iNodeSetOrdering] - 1)    
+    # Scale length, width and depth dimensions. The scaled coordinates are written straight into the output
+    # buffer (columns: node ID, X, Y, Z); entries left at 1E20 flag nodes that belong to none of the ordered sets
+    arrayNodalCoordsScaled = np.full((len(arrayNodes),4), 1E20, dtype=np.float64)
+    arrayNodalCoordsScaled[:,0] = arrayNodes
+    iNodeSetsAlongLength = np.array([nameToIdx[nameNodeSet] for nameNodeSet in listNodeSetsForOrderingAlongLength], dtype=np.int64)
+    scaleCoordinatesAlongAxis(arrayCoordinates[:,1], arrayNodalCoordsScaled[:,2], iNodeSetsAlongLength, listScalingFactorsAlongLength,
+                              arrayMinCoordinatesForUnorderedSets[iNodeSetsAlongLength,1],
+                              arrayMaxCoordinatesForUnorderedSets[iNodeSetsAlongLength,1],
+                              nodeSetIdx, idxNodeSets, idxStartsOfNodeSets, useNumba)
+    iNodeSetsAlongWidth = np.array([nameToIdx[nameNodeSet] for nameNodeSet in listNodeSetsForOrderingAlongWidth], dtype=np.int64)
+    scaleCoordinatesAlongAxis(arrayCoordinates[:,0], arrayNodalCoordsScaled[:,1], iNodeSetsAlongWidth, listScalingFactorsAlongWidth,
+                              arrayMinCoordinatesForUnorderedSets[iNodeSetsAlongWidth,0],
+                              arrayMaxCoordinatesForUnorderedSets[iNodeSetsAlongWidth,0],
+                              nodeSetIdx, idxNodeSets, idxStartsOfNodeSets, useNumba)
+    iNodeSetsAlongDepth = np.array([nameToIdx[nameNodeSet] for nameNodeSet in listNodeSetsForOrderingAlongDepth], dtype=np.int64)
+    scaleCoordinatesAlongAxis(arrayCoordinates[:,2], arrayNodalCoordsScaled[:,3], iNodeSetsAlongDepth, listScalingFactorsAlongDepth,
+                              arrayMinCoordinatesForUnorderedSets[iNodeSetsAlongDepth,2],
+                              arrayMaxCoordinatesForUnorderedSets[iNodeSetsAlongDepth,2],
+                              nodeSetIdx, idxNodeSets, idxStartsOfNodeSets, useNumba)
         
+    # Release the unscaled coordinates and node set indices to lower the peak memory while writing
+    del arrayCoordinates, nodeSetIdx, idxNodeSets
+    
     # write the scaled nodal information to a file
-    out_path = pathDir + 'nodalCoordsScaled.dat'
-    with open(out_path, 'w') as file_out:
-        for iNode in range(0,len(listNodes)):
-            file_out.write("{0:8d}{1:2s}{2:25.10f}{3:2s}{4:25.10f}{5:2s}{6:25.10f}\n".format(listNodes[iNode], ",",\
-                                                                           listCoordinatesXscaled[iNode], ",",\
-                                                                           listCoordinatesYscaled[iNode], ",",\
-                                                                           listCoordinatesZscaled[iNode]))
-    file_out.close()
+    if os.environ.get('ABQ_SCALER_BINARY', '0') == '1':
+        out_path = pathDir + 'nodalCoordsScaled.npy'
+        np.save(out_path, arrayNodalCoordsScaled)
+    else:
+        out_path = pathDir + 'nodalCoordsScaled.dat'
+        np.savetxt(out_path, arrayNodalCoordsScaled, fmt="%8d, %25.10f, %25.10f, %25.10f")
         
     
     
+def pickOrdering(minFirst, minLast, listNodeSetsOrdered, listScalingFactors):
+    ''' Returns the node sets and their scaling factors in increasing coordinate order: as given if the first
+        set lies below the last one (minFirst < minLast), reversed otherwise
+    '''
+    if minFirst < minLast:
+        return listNodeSetsOrdered, listScalingFactors
+    return listNodeSetsOrdered[::-1], listScalingFactors[::-1]
+    
+def scaleCoordinatesAlongAxis(arrayCoordinates, arrayCoordinatesScaled, iNodeSetsOrdered, listScalingFactors, arrayMinCoordinates,
+                              arrayMaxCoordinates, nodeSetIdx, idxNodeSets, idxStartsOfNodeSets, useNumba=False):
+    ''' Scales the coordinates along one axis region by region. The node sets (iNodeSetsOrdered) are visited in
+        increasing coordinate order and each region is stretched about its minimum coordinate, with all the
+        regions that follow shifted by the accumulated change in length. arrayMinCoordinates/arrayMaxCoordinates
+        hold the extents of the sets in the same order. The result is written in place into arrayCoordinatesScaled;
+        entries of nodes not in any of the ordered sets are left untouched. nodeSetIdx holds the row indices of
+        each set, and idxNodeSets/idxStartsOfNodeSets the same indices concatenated (used by the numba kernel).
+    '''
+    if useNumba:
+        getScaleCoordinatesAlongAxisKernel()(arrayCoordinates, arrayCoordinatesScaled, idxNodeSets, idxStartsOfNodeSets,
+                                             iNodeSetsOrdered, arrayMinCoordinates, arrayMaxCoordinates,
+                                             np.asarray(listScalingFactors, dtype=np.float64))
+    else:
+        translationTotal = 0
+        for iNodeSet, minForThisRegion, maxForThisRegion, scalingFactor in zip(iNodeSetsOrdered, arrayMinCoordinates,
+                                                                               arrayMaxCoordinates, listScalingFactors):
+            idx = nodeSetIdx[iNodeSet]
+            arrayCoordinatesScaled[idx] = translationTotal + minForThisRegion + (arrayCoordinates[idx] - minForThisRegion)*scalingFactor
+            translationTotal = translationTotal + (maxForThisRegion - minForThisRegion)*(scalingFactor - 1)
+    
+def scaleCoordinatesAlongAxisLoop(arrayCoordinates, arrayCoordinatesScaled, idxNodeSets, idxStartsOfNodeSets, iNodeSetsOrdered,
+                                  arrayMinCoordinates, arrayMaxCoordinates, arrayScalingFactors):
+    ''' Same as the NumPy path of scaleCoordinatesAlongAxis, but each node is read and written once without
+        temporary arrays. Only meant to be run compiled, see getScaleCoordinatesAlongAxisKernel
+    '''
+    translationTotal = 0.0
+    for k in range(len(iNodeSetsOrdered)):
+        iNodeSet = iNodeSetsOrdered[k]
+        minForThisRegion = arrayMinCoordinates[k]
+        scalingFactor = arrayScalingFactors[k]
+        for p in range(idxStartsOfNodeSets[iNodeSet], idxStartsOfNodeSets[iNodeSet+1]):
+            j = idxNodeSets[p]
+            arrayCoordinatesScaled[j] = translationTotal + minForThisRegion + (arrayCoordinates[j] - minForThisRegion)*scalingFactor
+        translationTotal = translationTotal + (arrayMaxCoordinates[k] - minForThisRegion)*(scalingFactor - 1.0)
+    
+scaleCoordinatesAlongAxisKernel = None
+
+def getScaleCoordinatesAlongAxisKernel():
+    ''' Imports numba and compiles scaleCoordinatesAlongAxisLoop on first use, so that runs not requesting
+        the kernel (ABQ_SCALER_NUMBA) pay neither the import nor the compilation
+    '''
+    global scaleCoordinatesAlongAxisKernel
+    if scaleCoordinatesAlongAxisKernel is None:
+        from numba import njit
+        scaleCoordinatesAlongAxisKernel = njit(cache=True)(scaleCoordinatesAlongAxisLoop)
+    return scaleCoordinatesAlongAxisKernel
+    
 if __name__ == "__main__":
     main()
\ No newline at end of file